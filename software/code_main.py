@@ -0,0 +1,485 @@
+import array
+import time
+import board
+import digitalio
+from supervisor import ticks_ms
+
+# Onboard NeoPixel driver; optional, the pixel is simply skipped without it.
+try:
+    import neopixel_write  # type: ignore
+    _NPW = neopixel_write.neopixel_write
+except ImportError:
+    _NPW = None
+
+# asyncio (from the CircuitPython bundle) lets BLE housekeeping run as its
+# own task; without it both jobs share one plain loop.
+try:
+    import asyncio
+    ASYNCIO_AVAILABLE = True
+except ImportError:
+    ASYNCIO_AVAILABLE = False
+
+# keypad (CircuitPython 7+) debounces and queues edges in C; fall back to
+# polling the pins when it is missing from the build.
+try:
+    import keypad
+    KEYPAD_AVAILABLE = True
+except ImportError:
+    KEYPAD_AVAILABLE = False
+
+# memorymap lets the polling fallback read the GPIO input register directly.
+try:
+    import memorymap
+    MEMORYMAP_AVAILABLE = True
+except ImportError:
+    MEMORYMAP_AVAILABLE = False
+
+# BLE imports - requires adafruit_ble from the CircuitPython bundle
+try:
+    from adafruit_ble import BLERadio
+    from adafruit_ble.advertising.standard import ProvideServicesAdvertisement
+    from adafruit_ble.services.nordic import UARTService
+    BLE_AVAILABLE = True
+except ImportError:
+    BLE_AVAILABLE = False
+    print("WARNING: BLE libraries not found. Install adafruit_ble library bundle.")
+
+# ----------------------------
+# CONFIG (per-board pin map)
+# ----------------------------
+# Pins are looked up by name so a board that lacks one of them doesn't
+# fail while this table is built. Known boards get a "neopixel" entry only
+# if they have an onboard NeoPixel, so nothing is probed for them at boot.
+# "gpio_in" is (GPIO_IN_REG address, dit bit, dah bit) for boards whose
+# input register the polling fallback may read directly. Unknown boards
+# use the Rev B pin names (failing with a clear error if they lack them)
+# and whatever board.NEOPIXEL they provide.
+# Rev B: TRRS tip (left) -> GPIO7 (board.D5), ring (right) -> GPIO21 (board.D6)
+BOARD_ID = getattr(board, "board_id", "")
+BOARDS = {
+    "seeed_xiao_esp32c3": {"dit": "D5", "dah": "D6", "gpio_in": (0x6000403C, 7, 21)},
+}
+_DEFAULT_BOARD = {"dit": "D5", "dah": "D6"}
+_board_cfg = BOARDS.get(BOARD_ID)
+
+def _board_pin(name: str):
+    pin = getattr(board, name, None)
+    if pin is None:
+        raise RuntimeError(
+            f"Board {BOARD_ID!r} has no pin board.{name}; add it to BOARDS."
+        )
+    return pin
+
+# _pixel_probed: PIXEL_PIN came from probing rather than the table, so it
+# may be claimed or unusable and is set up under a try/except.
+if _board_cfg is None:
+    _board_cfg = _DEFAULT_BOARD
+    PIXEL_PIN = getattr(board, "NEOPIXEL", None)
+    _pixel_probed = True
+elif "neopixel" in _board_cfg:
+    PIXEL_PIN = _board_pin(_board_cfg["neopixel"])
+    _pixel_probed = False
+else:
+    PIXEL_PIN = None
+    _pixel_probed = False
+
+DIT_PIN = _board_pin(_board_cfg["dit"])  # TRRS TIP / left
+DAH_PIN = _board_pin(_board_cfg["dah"])  # TRRS RING / right
+
+DEBOUNCE_MS = 10       # 10ms debounce
+# Spin without sleeping for ACTIVE_WINDOW_MS after an edge, then relax
+# between scans so the CPU can idle. The window spans element and
+# character gaps (60/180 ms at 20 WPM, longer when sending slowly), so
+# keying mid-word never waits on an idle sleep. The keypad path idles for
+# at most 1 ms, no worse than the old fixed sleep; keypad timestamps and
+# queues edges in C meanwhile. The polling fallback idles longer.
+ACTIVE_WINDOW_MS = 1000
+KEYPAD_IDLE_SLEEP_S = 0.001
+IDLE_SLEEP_S = 0.005
+BLE_CONNECTED_POLL_MS = 20  # how often the cached ble.connected is refreshed
+BLE_ADVERTISE_MS = 500      # how often a stopped advertisement is restarted
+# Per-edge serial logging. Off by default: printing over USB-CDC can block
+# for milliseconds when the host isn't reading, long enough to miss edges.
+DEBUG = False
+
+if DEBUG:
+    def log_event(name: str) -> None:
+        print(ticks_ms(), name)
+else:
+    def log_event(name: str) -> None:
+        pass
+
+# ----------------------------
+# Optional onboard NeoPixel (no neopixel module needed)
+# ----------------------------
+PIXEL_ENABLED = True
+_pixel_ok = PIXEL_ENABLED and PIXEL_PIN is not None and _NPW is not None
+_pixel_current = None  # buffer last written by _pixel_raw(), None if unknown
+
+if _pixel_ok and _pixel_probed:
+    try:
+        _pixel_io = digitalio.DigitalInOut(PIXEL_PIN)
+        _pixel_io.direction = digitalio.Direction.OUTPUT
+    except Exception:
+        _pixel_ok = False
+elif _pixel_ok:
+    _pixel_io = digitalio.DigitalInOut(PIXEL_PIN)
+    _pixel_io.direction = digitalio.Direction.OUTPUT
+
+if _pixel_ok:
+    def pixel_set(r: int, g: int, b: int):
+        """Set pixel color. Most NeoPixels are GRB order.
+
+        Slow-path convenience only; hot-path callers must use _pixel_raw()
+        with a precomputed PIXEL_* buffer.
+        """
+        global _pixel_current, STATE
+        _pixel_current = None
+        STATE = None  # next set_state() must repaint
+        r = 0 if r < 0 else (255 if r > 255 else r)
+        g = 0 if g < 0 else (255 if g > 255 else g)
+        b = 0 if b < 0 else (255 if b > 255 else b)
+        _NPW(_pixel_io, bytes([g, r, b]))
+
+    def _pixel_raw(buf: bytes):
+        """Write a precomputed GRB buffer, skipping it if already shown.
+
+        neopixel_write runs with interrupts disabled, so redundant writes
+        are worth avoiding. Callers pass the shared PIXEL_* objects, which
+        makes an identity check enough.
+        """
+        global _pixel_current
+        if buf is _pixel_current:
+            return
+        _pixel_current = buf
+        _NPW(_pixel_io, buf)
+else:
+    # No pixel on this board: every pixel call is a no-op.
+    def pixel_set(r: int, g: int, b: int):
+        pass
+
+    def _pixel_raw(buf: bytes):
+        pass
+
+def pixel_off():
+    global STATE
+    STATE = None  # next set_state() must repaint
+    _pixel_raw(PIXEL_OFF)
+
+# Precomputed GRB buffers for the hot path; pushed straight to the pixel
+# without clamping or allocating.
+PIXEL_IDLE = bytes([0, 0, 12])        # dim blue
+PIXEL_CONNECTED = bytes([0, 12, 12])  # purple
+PIXEL_DIT = bytes([20, 0, 0])         # green
+PIXEL_DAH = bytes([0, 0, 20])         # brighter blue
+PIXEL_OFF = bytes([0, 0, 0])
+
+# ----------------------------
+# Device state -> pixel colour
+# ----------------------------
+IDLE = 0
+CONNECTED = 1
+DIT_ACTIVE = 2
+DAH_ACTIVE = 3
+PIXEL_MAP = {
+    IDLE: PIXEL_IDLE,
+    CONNECTED: PIXEL_CONNECTED,
+    DIT_ACTIVE: PIXEL_DIT,
+    DAH_ACTIVE: PIXEL_DAH,
+}
+STATE = None
+
+def set_state(s: int) -> None:
+    """Enter device state `s`; the pixel only changes on a real transition."""
+    global STATE
+    if s == STATE:
+        return
+    STATE = s
+    _pixel_raw(PIXEL_MAP[s])
+
+# ticks_ms() is an allocation-free int clock that wraps at 2**29 ms; always
+# compare timestamps through ticks_diff().
+_TICKS_PERIOD = 1 << 29
+_TICKS_MAX = _TICKS_PERIOD - 1
+_TICKS_HALFPERIOD = _TICKS_PERIOD // 2
+
+def ticks_diff(t1: int, t2: int) -> int:
+    """Signed t1 - t2 in ms, correct across a ticks_ms() wrap."""
+    diff = (t1 - t2) & _TICKS_MAX
+    return ((diff + _TICKS_HALFPERIOD) & _TICKS_MAX) - _TICKS_HALFPERIOD
+
+# ----------------------------
+# Setup inputs (active-low with pullups)
+# ----------------------------
+keys = None
+paddles = None
+gpio_in_reg = None
+if KEYPAD_AVAILABLE:
+    # Key 0 = DIT, key 1 = DAH. keypad samples the pins every DEBOUNCE_MS
+    # and queues an event whenever a pin differs from the previous sample;
+    # the slow sampling rate is what rides out contact bounce.
+    keys = keypad.Keys(
+        (DIT_PIN, DAH_PIN),
+        value_when_pressed=False,
+        pull=True,
+        interval=DEBOUNCE_MS / 1000,
+        max_events=16,
+    )
+else:
+    dit = digitalio.DigitalInOut(DIT_PIN)
+    dit.direction = digitalio.Direction.INPUT
+    dit.pull = digitalio.Pull.UP
+
+    dah = digitalio.DigitalInOut(DAH_PIN)
+    dah.direction = digitalio.Direction.INPUT
+    dah.pull = digitalio.Pull.UP
+
+    # Per-paddle arrays indexed by key number (0 = DIT, 1 = DAH) so both
+    # channels share one code path. state holds the last *reported* value;
+    # edges are reported eagerly, then that pin is locked out for
+    # DEBOUNCE_MS to ride out contact bounce. lockout holds the ticks_ms()
+    # of the last reported edge.
+    paddles = (dit, dah)
+    state = bytearray([dit.value, dah.value])
+    lockout = array.array("l", [ticks_ms(), ticks_ms()])
+
+    # Where possible, read both pins with one register access instead of
+    # two DigitalInOut.value calls. The DigitalInOuts above still own the
+    # pins and their pull-ups.
+    if MEMORYMAP_AVAILABLE and "gpio_in" in _board_cfg:
+        _gpio_in_addr, _dit_bit, _dah_bit = _board_cfg["gpio_in"]
+        gpio_in_reg = memorymap.AddressRange(start=_gpio_in_addr, length=4)
+        gpio_bits = (_dit_bit, _dah_bit)
+
+last_edge = ticks_ms()  # last reported paddle edge, drives scan_once() delay
+_idle_sleep = KEYPAD_IDLE_SLEEP_S if keys is not None else IDLE_SLEEP_S
+
+set_state(IDLE)
+
+# ----------------------------
+# BLE Setup
+# ----------------------------
+ble = None
+uart = None
+advertisement = None
+if BLE_AVAILABLE:
+    ble = BLERadio()
+    ble.name = "MorseKey"
+    uart = UARTService()
+    advertisement = ProvideServicesAdvertisement(uart)
+    # Keep the device name in the primary advertisement for iOS discovery.
+    advertisement.complete_name = ble.name
+    print(f"Advertisement services: {advertisement.services}")
+
+last_connected = False
+last_uart_error = (ticks_ms() - 2001) & _TICKS_MAX  # first error always logs
+
+# Bound once so the hot path skips the attribute lookup on every write.
+_uart_write = uart.write if uart is not None else None
+
+# Outgoing event bytes. Edge handling only appends here; the BLE write
+# happens once per loop in uart_flush() so a slow notification can't stall
+# paddle scanning.
+# Every event line is EVENT_LEN bytes (e.g. b"K1:1\n"). TX_MAX and
+# TX_FIFO_CAP are whole multiples of it, so the FIFO always holds complete
+# lines and each notification starts on a line boundary.
+TX_FIFO = bytearray()
+EVENT_LEN = 5
+TX_MAX = 4 * EVENT_LEN         # 20: one notification, ATT_MTU (23) minus 3
+TX_FIFO_CAP = 50 * EVENT_LEN   # drop the oldest lines beyond this
+
+def uart_queue(data, connected: bool) -> None:
+    """Queue newline-terminated event bytes; `connected` is the cached state."""
+    if not connected:
+        return
+    TX_FIFO.extend(data)
+    excess = len(TX_FIFO) - TX_FIFO_CAP
+    if excess > 0:
+        # Both lengths are multiples of EVENT_LEN, so this cuts whole lines.
+        TX_FIFO[:excess] = b""
+
+def uart_flush(connected: bool) -> None:
+    """Send up to TX_MAX queued bytes."""
+    global last_uart_error
+    if not (connected and TX_FIFO):
+        return
+    # The slice is the only copy; it can't be a memoryview because the
+    # trim below resizes TX_FIFO in place.
+    chunk = TX_FIFO[:TX_MAX]
+    TX_FIFO[:TX_MAX] = b""  # MicroPython bytearray has no slice del
+    try:
+        _uart_write(chunk)
+    except Exception as exc:
+        now = ticks_ms()
+        if not 0 <= ticks_diff(now, last_uart_error) <= 2000:
+            print("UART write failed:", repr(exc))
+            last_uart_error = now
+
+print("=== MorseForge TRRS + BLE ===")
+print("Board:", BOARD_ID)
+print("DIT pin:", DIT_PIN)
+print("DAH pin:", DAH_PIN)
+print("Debounce:", DEBOUNCE_MS, "ms")
+if BLE_AVAILABLE:
+    print("BLE Name:", ble.name)
+    print("Starting BLE advertising...")
+    ble.start_advertising(advertisement)
+    print("Ready. Press paddles/key...")
+else:
+    print("BLE not available - running in serial-only mode")
+    print("Ready. Press paddles/key...")
+
+# Event lines as ready-to-send bytes, so an edge never builds or encodes
+# a string.
+EV_K1_DOWN = b"K1:1\n"  # Key 1 (dit/left paddle) pressed
+EV_K1_UP = b"K1:0\n"
+EV_K2_DOWN = b"K2:1\n"  # Key 2 (dah/right paddle) pressed
+EV_K2_UP = b"K2:0\n"
+
+# Events reported during the current scan; flushed to TX_FIFO together so
+# a simultaneous squeeze goes out in a single notification.
+PENDING = bytearray()
+
+# Lookup tables indexed [key_number][released].
+EVENTS = ((EV_K1_DOWN, EV_K1_UP), (EV_K2_DOWN, EV_K2_UP))
+LOG_NAMES = (("DIT_DOWN", "DIT_UP"), ("DAH_DOWN", "DAH_UP"))
+PRESS_STATES = (DIT_ACTIVE, DAH_ACTIVE)
+
+def handle_key(key_number: int, pressed: bool, connected: bool) -> None:
+    """Report one paddle transition. key_number 0 = DIT, 1 = DAH."""
+    released = 0 if pressed else 1
+    log_event(LOG_NAMES[key_number][released])
+    if pressed:
+        set_state(PRESS_STATES[key_number])
+    else:
+        set_state(CONNECTED if connected else IDLE)
+    PENDING.extend(EVENTS[key_number][released])
+
+# ----------------------------
+# Main loop
+# ----------------------------
+# Cached ble.connected, refreshed only by ble_poll() so the scan path reads
+# a plain global.
+connected = False
+
+def ble_poll() -> None:
+    """Refresh the cached connection state and react to changes."""
+    global connected, last_connected
+    if not (BLE_AVAILABLE and ble):
+        return
+    connected = ble.connected
+    if connected == last_connected:
+        return
+    last_connected = connected
+    if connected:
+        print("BLE connected.")
+        set_state(CONNECTED)
+    else:
+        print("BLE disconnected.")
+        TX_FIFO[:] = b""  # don't replay stale events on reconnect
+        set_state(IDLE)
+
+def ble_advertise() -> None:
+    """Restart advertising if we're disconnected and it has stopped."""
+    if not (BLE_AVAILABLE and ble) or connected or ble.advertising:
+        return
+    print("Restarting BLE advertising...")
+    ble.start_advertising(advertisement)
+
+last_ble_poll = ticks_ms()
+last_advertise = last_ble_poll
+
+def ble_service(now: int) -> None:
+    """BLE housekeeping, rate-limited the same way in both loop modes."""
+    global last_ble_poll, last_advertise
+    if ticks_diff(now, last_ble_poll) < BLE_CONNECTED_POLL_MS:
+        return
+    last_ble_poll = now
+    ble_poll()
+    if ticks_diff(now, last_advertise) >= BLE_ADVERTISE_MS:
+        last_advertise = now
+        ble_advertise()
+
+# Bound once so scan_once() skips the keys.events.get attribute chain.
+_events_get = keys.events.get if keys is not None else None
+
+def scan_once() -> float:
+    """Report new paddle edges and send queued UART bytes.
+
+    Returns how long to sleep before the next scan.
+    """
+    global last_edge
+    now = ticks_ms()
+    if keys is not None:
+        # Only do work when keypad has queued an edge. keypad keeps
+        # sampling and queueing in C while we sleep, so nothing is lost.
+        ev = _events_get()
+        if ev:
+            last_edge = now
+        while ev:
+            handle_key(ev.key_number, ev.pressed, connected)
+            ev = _events_get()
+    else:
+        # Fallback: poll both pins with eager per-key debounce. Edges seen
+        # during a lockout are dropped; once it expires the pin is compared
+        # against the reported state again, so a real release is not lost.
+        # A lockout is only active for 0 <= diff < DEBOUNCE_MS: a timestamp
+        # older than half the ticks_ms() period reads as negative and must
+        # count as expired, not as "in the future".
+        if gpio_in_reg is not None:
+            # A 4-byte slice is the only way AddressRange does one aligned
+            # 32-bit access, which the peripheral register needs; indexing
+            # byte by byte would not be atomic across both pins. The cost
+            # is one short-lived 4-byte object per scan.
+            gpio_in = int.from_bytes(gpio_in_reg[0:4], "little")
+            for i in range(2):
+                v = (gpio_in >> gpio_bits[i]) & 1
+                if v != state[i] and not 0 <= ticks_diff(now, lockout[i]) < DEBOUNCE_MS:
+                    lockout[i] = now
+                    state[i] = v
+                    handle_key(i, not v, connected)  # active low
+                    last_edge = now
+        else:
+            for i in range(2):
+                v = paddles[i].value
+                if v != state[i] and not 0 <= ticks_diff(now, lockout[i]) < DEBOUNCE_MS:
+                    lockout[i] = now
+                    state[i] = v
+                    handle_key(i, not v, connected)  # active low
+                    last_edge = now
+    if PENDING:
+        uart_queue(PENDING, connected)
+        PENDING[:] = b""
+    uart_flush(connected)
+    # Out-of-range diffs (last_edge older than half the ticks_ms() period)
+    # count as idle, so a long quiet spell can't fall back into spinning.
+    if not 0 <= ticks_diff(now, last_edge) < ACTIVE_WINDOW_MS:
+        return _idle_sleep
+    return 0
+
+async def scan_task():
+    # Locals resolve faster than module globals in the hot loop.
+    _scan = scan_once
+    _sleep = asyncio.sleep
+    while True:
+        await _sleep(_scan())
+
+async def ble_task():
+    while True:
+        ble_service(ticks_ms())
+        await asyncio.sleep(BLE_CONNECTED_POLL_MS / 1000)
+
+async def main():
+    await asyncio.gather(
+        asyncio.create_task(scan_task()),
+        asyncio.create_task(ble_task()),
+    )
+
+if ASYNCIO_AVAILABLE:
+    asyncio.run(main())
+else:
+    while True:
+        ble_service(ticks_ms())
+        delay = scan_once()
+        if delay:
+            time.sleep(delay)